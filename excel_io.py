@@ -0,0 +1,274 @@
+"""
+Excel I/O Helpers
+
+Shared by generate_category_report.py and generate_services_report.py:
+reading the Power BI 'Export' sheet (optionally through a Parquet sidecar
+cache) and writing the single-sheet report workbooks.
+"""
+
+import importlib.util
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import pandas as pd
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# pandas only knows the calamine engine from 2.2 on; older versions raise
+# ValueError("Unknown engine") instead of ImportError
+PANDAS_HAS_CALAMINE = tuple(int(part) for part in re.findall(r'\d+', pd.__version__)[:2]) >= (2, 2)
+
+# Metric columns are those that start with '[' and end with ']'
+METRIC_COLUMN_PATTERN = re.compile(r'\[.*\]', re.DOTALL)
+
+# Part of the Parquet cache key; bump whenever reading or projection changes
+# in a way that makes previously cached frames invalid
+CACHE_VERSION = 1
+
+
+def is_metric_column(col) -> bool:
+    """
+    Check whether a column header names a metric.
+    
+    Args:
+        col: Column header
+    
+    Returns:
+        True if the header starts with '[' and ends with ']'
+    """
+    return isinstance(col, str) and METRIC_COLUMN_PATTERN.fullmatch(col) is not None
+
+
+def dedupe_columns(header) -> list:
+    """
+    Name and de-duplicate header cells in the style of pandas' readers.
+    
+    Empty headers become 'Unnamed: <position>' and repeated names get a
+    '.1', '.2', ... suffix, so the first occurrence keeps the plain name.
+    
+    Args:
+        header: Header row values
+        
+    Returns:
+        List of unique column names
+    """
+    counts = {}
+    names = []
+    for i, col in enumerate(header):
+        if col is None:
+            col = f'Unnamed: {i}'
+        count = counts.get(col, 0)
+        while count > 0:
+            counts[col] = count + 1
+            col = f'{col}.{count}'
+            count = counts.get(col, 0)
+        counts[col] = count + 1
+        names.append(col)
+    return names
+
+
+def export_sheet_reader() -> str:
+    """
+    Return the reader read_export_sheet uses in this environment.
+    
+    Returns:
+        'calamine' if python-calamine is installed (pandas 2.2+), otherwise
+        'xlsx2csv' if that command is on PATH, otherwise 'openpyxl'
+    """
+    if PANDAS_HAS_CALAMINE and importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    if shutil.which('xlsx2csv') is not None:
+        return 'xlsx2csv'
+    return 'openpyxl'
+
+
+def read_export_sheet(input_file: str, usecols: Optional[Callable[[str], bool]] = None,
+                      reader: Optional[str] = None) -> pd.DataFrame:
+    """
+    Read the 'Export' sheet of an Excel file into a dataframe.
+    
+    Uses the Rust-based calamine engine when python-calamine is installed
+    (pandas 2.2+). Otherwise the sheet is converted to CSV with the xlsx2csv
+    command (if it is on PATH) and parsed with read_csv, and as a last resort
+    it is streamed with openpyxl in read-only mode.
+    
+    Args:
+        input_file: Path to the input Excel file
+        usecols: Optional predicate selecting which columns to read
+        reader: Reader to use (see export_sheet_reader); detected if omitted
+        
+    Returns:
+        DataFrame containing the Export sheet data
+    """
+    if reader is None:
+        reader = export_sheet_reader()
+    
+    if reader == 'calamine':
+        return pd.read_excel(input_file, sheet_name='Export', engine='calamine', usecols=usecols)
+    
+    # Convert only the Export sheet to CSV, keeping raw values rather than
+    # their display formats, and parse it with the faster CSV reader. Date/time
+    # detection is disabled too: it misreads number formats with quoted text
+    # (e.g. '#,##0.00 "USD"'), and the sheet holds only names and numbers.
+    # '--' stops a path starting with '-' from being parsed as an option
+    if reader == 'xlsx2csv':
+        csv_data = subprocess.check_output(
+            ['xlsx2csv', '--ignore-formats', 'float', 'percentage', 'date', 'time',
+             '-n', 'Export', '--', str(input_file)]
+        )
+        return pd.read_csv(io.BytesIO(csv_data), usecols=usecols)
+    
+    # Stream the sheet in read-only mode instead of loading the full workbook;
+    # openpyxl is only imported when this fallback is actually needed
+    import openpyxl
+    
+    wb = openpyxl.load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        ws = wb['Export']
+        # Read-only mode trusts the sheet's stored dimensions, which may be
+        # missing or wrong, so reset them and pad/trim rows to the header width
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("'Export' sheet is empty")
+        width = len(header)
+        rows = (row[:width] + (None,) * (width - len(row)) for row in rows)
+        # Match read_excel/read_csv, which keep repeated headers apart
+        header = dedupe_columns(header)
+        if usecols is not None:
+            keep = [i for i, col in enumerate(header) if usecols(col)]
+            header = [header[i] for i in keep]
+            rows = ([row[i] for i in keep] for row in rows)
+        df = pd.DataFrame(rows, columns=header)
+    finally:
+        wb.close()
+    return df
+
+
+def has_non_numeric_metrics(df: pd.DataFrame) -> bool:
+    """
+    Check whether any metric column holds values that are not numbers.
+    
+    Args:
+        df: Export sheet data
+        
+    Returns:
+        True if a non-empty metric cell cannot be converted to a number
+    """
+    for col in df.columns:
+        if not is_metric_column(col) or pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col]
+        if (pd.to_numeric(values, errors='coerce').isna() & values.notna()).any():
+            return True
+    return False
+
+
+def read_export_sheet_cached(input_file: str, key_column: str) -> Tuple[pd.DataFrame, bool]:
+    """
+    Read the key column and metric columns of the 'Export' sheet, reusing a
+    Parquet sidecar cache when it is valid.
+    
+    The cache is stored next to the input file as '<name>.cache.parquet'. It
+    records CACHE_VERSION, the source file's size and mtime, the reader that
+    parsed it and the column projection (key column and metric pattern), and
+    is only used when all of them match exactly. Frames with non-numeric
+    metric cells are not cached. Caching is best effort: an unreadable cache
+    is ignored and a failed write never fails the read.
+    
+    Args:
+        input_file: Path to the input Excel file
+        key_column: Name of the column identifying each row (part of the cache key)
+    
+    Returns:
+        Tuple of (Export sheet data, whether it was loaded from the cache)
+    """
+    input_path = Path(input_file)
+    cache = input_path.with_suffix('.cache.parquet')
+    source = input_path.stat()
+    reader = export_sheet_reader()
+    cache_key = {
+        'cache_version': CACHE_VERSION,
+        'source_size': source.st_size,
+        'source_mtime_ns': source.st_mtime_ns,
+        'reader': reader,
+        'key_column': key_column,
+        'metric_pattern': METRIC_COLUMN_PATTERN.pattern,
+    }
+    
+    if cache.exists():
+        try:
+            cached = pd.read_parquet(cache)
+        except Exception:
+            # Partial/corrupt cache or no Parquet engine: reparse the Excel file
+            cached = None
+        if (cached is not None and cached.attrs.get('cache_key') == cache_key
+                and key_column in cached.columns):
+            cached.attrs = {}
+            return cached, True
+    
+    # Only the key column and metric columns are read; everything else is
+    # skipped by the parser
+    df = read_export_sheet(input_file, usecols=lambda col: col == key_column or is_metric_column(col),
+                           reader=reader)
+    
+    # A frame whose metrics will need coercion may come from a bad parse, so
+    # it is never persisted; the next run reads the workbook again
+    if has_non_numeric_metrics(df):
+        return df, False
+    
+    # Write to a temporary file and move it into place, so an interrupted
+    # write never leaves a truncated cache behind
+    tmp_name = None
+    try:
+        fd, tmp_name = tempfile.mkstemp(prefix=cache.name + '.', suffix='.tmp', dir=cache.parent)
+        os.close(fd)
+        to_cache = df.copy(deep=False)
+        to_cache.attrs = {'cache_key': cache_key}
+        to_cache.to_parquet(tmp_name, index=False)
+        os.replace(tmp_name, cache)
+    except Exception:
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+    
+    return df, False
+
+
+def write_excel(df: pd.DataFrame, output_file: str, sheet_name: str, index: bool):
+    """
+    Write a dataframe to a single-sheet Excel file.
+    
+    When xlsxwriter is installed the sheet is streamed to disk row by row in
+    constant_memory mode; otherwise pandas' openpyxl writer is used.
+    
+    Args:
+        df: Dataframe to write
+        output_file: Path to the output Excel file
+        sheet_name: Name of the worksheet
+        index: Whether to write the index as the first column
+    """
+    if xlsxwriter is None:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=index)
+        return
+    
+    # constant_memory only keeps the current row in memory, so cells must be
+    # written row by row (pandas' to_excel writes column by column)
+    frame = df.reset_index() if index else df
+    with xlsxwriter.Workbook(output_file, {'constant_memory': True}) as workbook:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, list(frame.columns))
+        for row_idx, row in enumerate(frame.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_idx, 0, [None if pd.isna(value) else value for value in row])
@@ -14,9 +14,12 @@ Example:
 """
 
 import sys
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from excel_io import read_export_sheet_cached, write_excel
+
 
 def read_category_data(input_file):
     """
@@ -30,7 +33,9 @@ def read_category_data(input_file):
     """
     print(f"Reading data from: {input_file}")
     try:
-        df = pd.read_excel(input_file, sheet_name='Export')
+        df, from_cache = read_export_sheet_cached(input_file, 'Master_CPC[TME Category]')
+        if from_cache:
+            print("✓ Loaded data from Parquet cache")
         print(f"✓ Successfully read {len(df)} rows from 'Export' sheet")
         return df
     except Exception as e:
@@ -38,6 +43,32 @@ def read_category_data(input_file):
         sys.exit(1)
 
 
+def coerce_metric_values(df, category_col, metric_cols):
+    """
+    Convert metric columns to numbers so they fit the float64 output array.
+    
+    Non-numeric cells (e.g. '-') become NaN, which the report later treats
+    as 0, and a warning names the affected categories.
+    
+    Args:
+        df (pd.DataFrame): Category rows
+        category_col (str): Name of the category column
+        metric_cols (list): Metric columns to convert
+        
+    Returns:
+        pd.DataFrame: Numeric metric values
+    """
+    block = df[metric_cols]
+    numeric = block.apply(pd.to_numeric, errors='coerce')
+    
+    coerced = numeric.isna() & block.notna()
+    for metric in block.columns[coerced.any()]:
+        names = ', '.join(df.loc[coerced[metric], category_col])
+        print(f"  ⚠ Warning: Non-numeric '{metric}' values set to 0 for: {names}")
+    
+    return numeric
+
+
 def transform_to_column_format(df):
     """
     Transform data from row-based (one row per category) to column-based format
@@ -87,43 +118,44 @@ def transform_to_column_format(df):
         'Sports'
     ]
     
-    # Create output dataframe with metrics as index
-    output_df = pd.DataFrame(index=metrics)
-    output_df.index.name = 'Master_CPC[TME Category]'
-    
     # Use the 'Master_CPC[TME Category]' column for category names
     category_col = 'Master_CPC[TME Category]'
     
-    # Process each category
+    # Keep the first row per category, restricted to the categories we report
+    first_rows = df.drop_duplicates(subset=category_col)
+    present = first_rows[first_rows[category_col].isin(categories)]
+    found = set(present[category_col])
+    
     for category in categories:
-        # Find the row for this category
-        category_row = df[df[category_col] == category]
-        
-        if len(category_row) == 0:
-            print(f"  ⚠ Warning: Category '{category}' not found in data")
-            # Fill with zeros if category not found
-            output_df[category] = 0
-        else:
-            # Extract values for each metric
-            category_data = category_row.iloc[0]
-            
-            # Map metrics to their values
-            for metric in metrics:
-                if metric in category_data.index:
-                    output_df.loc[metric, category] = category_data[metric]
-                else:
-                    # If metric not found, set to 0
-                    output_df.loc[metric, category] = 0
-            
+        if category in found:
             print(f"  ✓ Processed category: {category}")
+        else:
+            print(f"  ⚠ Warning: Category '{category}' not found in data")
+    
+    # The output shape is fixed (metrics × categories), so allocate it once and
+    # scatter the present rows/metrics into place; missing ones stay 0.
+    # float64 is kept on purpose: revenue sums need cent precision
+    category_pos = {category: j for j, category in enumerate(categories)}
+    metric_rows = [i for i, metric in enumerate(metrics) if metric in df.columns]
+    category_cols = [category_pos[category] for category in present[category_col]]
+    numeric = coerce_metric_values(present, category_col, [metrics[i] for i in metric_rows])
+    values = np.zeros((len(metrics), len(categories)), dtype='float64')
+    values[np.ix_(metric_rows, category_cols)] = numeric.to_numpy(dtype='float64').T
+    
+    # Replace NaN with 0 first, before calculating Edu+Img (in place, no copy)
+    np.putmask(values, np.isnan(values), 0.0)
     
-    # Replace NaN with 0 first, before calculating Edu+Img
-    output_df = output_df.fillna(0)
+    output_df = pd.DataFrame(values, index=metrics, columns=categories)
+    output_df.index.name = 'Master_CPC[TME Category]'
     
     # Add the special "Edu+Img" column after "Images"
     print("  Adding 'Edu+Img' calculated column...")
     if 'Education' in output_df.columns and 'Images' in output_df.columns:
-        edu_img_values = output_df['Education'] + output_df['Images']
+        # Add the raw arrays to skip pandas' index alignment (both share the metric index)
+        edu_img_values = pd.Series(
+            np.add(output_df['Education'].to_numpy(), output_df['Images'].to_numpy()),
+            index=output_df.index
+        )
         
         # Insert after Images column
         images_idx = output_df.columns.get_loc('Images')
@@ -146,7 +178,7 @@ def save_output(df, output_file):
     """
     print(f"\nSaving output to: {output_file}")
     try:
-        df.to_excel(output_file)
+        write_excel(df, output_file, sheet_name='Sheet1', index=True)
         print(f"✓ Successfully saved output file")
     except Exception as e:
         print(f"✗ Error saving file: {e}")
@@ -185,11 +217,12 @@ def main():
     # Save output
     save_output(output_df, output_file)
     
-    # Display preview
-    print("\n" + "=" * 70)
-    print("PREVIEW - First 5 rows:")
-    print("=" * 70)
-    print(output_df.head())
+    # Display preview (skipped when output is piped or redirected)
+    if sys.stdout.isatty():
+        print("\n" + "=" * 70)
+        print("PREVIEW - First 5 rows:")
+        print("=" * 70)
+        print(output_df.head())
     
     print("\n" + "=" * 70)
     print(f"✓ Process completed successfully!")
@@ -20,11 +20,13 @@ Date: 2025-10-02
 """
 
 import sys
+import numpy as np
 import pandas as pd
-import openpyxl
 from pathlib import Path
 from typing import List
 
+from excel_io import is_metric_column, read_export_sheet_cached, write_excel
+
 
 def read_input_data(input_file: str) -> pd.DataFrame:
     """
@@ -45,8 +47,10 @@ def read_input_data(input_file: str) -> pd.DataFrame:
     if not Path(input_file).exists():
         raise FileNotFoundError(f"Input file not found: {input_file}")
     
-    # Read the Export sheet
-    df = pd.read_excel(input_file, sheet_name='Export')
+    # Read the Export sheet, keeping only the columns the report uses
+    df, from_cache = read_export_sheet_cached(input_file, 'Master_CPC[Service Name]')
+    if from_cache:
+        print("   ✓ Loaded data from Parquet cache")
     
     # Verify required columns exist
     if 'Master_CPC[Service Name]' not in df.columns:
@@ -70,44 +74,11 @@ def get_metric_columns(df: pd.DataFrame) -> List[str]:
     Returns:
         List of metric column names
     """
-    metric_cols = [col for col in df.columns if col.startswith('[') and col.endswith(']')]
+    metric_cols = [col for col in df.columns if is_metric_column(col)]
     print(f"   ✓ Identified {len(metric_cols)} metric columns")
     return metric_cols
 
 
-def transform_data(df: pd.DataFrame, metric_cols: List[str]) -> pd.DataFrame:
-    """
-    Transform the data from services-as-rows to metrics-as-rows format.
-    
-    Args:
-        df: Input dataframe with services as rows
-        metric_cols: List of metric column names
-        
-    Returns:
-        Transformed dataframe with metrics as rows and services as columns
-    """
-    print("🔄 Transforming data structure...")
-    
-    # Extract service names and metrics
-    services = df['Master_CPC[Service Name]'].tolist()
-    
-    # Create a dictionary to hold the transformed data
-    transformed_data = {'Master_CPC[Service Name]': metric_cols}
-    
-    # For each service, extract all metric values
-    for service in services:
-        service_row = df[df['Master_CPC[Service Name]'] == service].iloc[0]
-        service_values = [service_row[metric] for metric in metric_cols]
-        transformed_data[service] = service_values
-    
-    # Create the transformed dataframe
-    df_transformed = pd.DataFrame(transformed_data)
-    
-    print(f"   ✓ Transformed to {len(df_transformed)} rows × {len(df_transformed.columns)} columns")
-    
-    return df_transformed
-
-
 def get_hardcoded_structure() -> tuple[List[str], List[str]]:
     """
     Return the hardcoded output structure (metric and service order).
@@ -162,18 +133,20 @@ def get_hardcoded_structure() -> tuple[List[str], List[str]]:
     return metric_order, service_order
 
 
-def apply_output_structure(df: pd.DataFrame, metric_order: List[str], 
-                          service_order: List[str]) -> pd.DataFrame:
+def apply_output_structure(df: pd.DataFrame, metric_cols: List[str],
+                          metric_order: List[str], service_order: List[str]) -> pd.DataFrame:
     """
-    Apply the hardcoded output structure to the transformed data.
+    Transform the input data and apply the hardcoded output structure.
     
-    This ensures:
+    The services-as-rows input is scattered straight into the fixed output
+    array, so no intermediate metrics-as-rows dataframe is built. This ensures:
     1. Metrics are in the correct order
     2. Services (columns) are in the correct order
-    3. Only specified metrics are included
+    3. Only specified metrics are included (missing ones are left empty)
     
     Args:
-        df: Transformed dataframe
+        df: Input dataframe with services as rows
+        metric_cols: List of metric column names found in the input
         metric_order: Desired order of metrics (rows)
         service_order: Desired order of services (columns)
         
@@ -182,19 +155,40 @@ def apply_output_structure(df: pd.DataFrame, metric_order: List[str],
     """
     print("📐 Applying output structure...")
     
-    # Filter to only include metrics in the specified order
-    df_filtered = df[df['Master_CPC[Service Name]'].isin(metric_order)].copy()
-    
-    # Create a mapping for metric order
-    metric_order_map = {metric: i for i, metric in enumerate(metric_order)}
-    df_filtered['_sort_order'] = df_filtered['Master_CPC[Service Name]'].map(metric_order_map)
-    
-    # Sort by the metric order
-    df_filtered = df_filtered.sort_values('_sort_order').drop('_sort_order', axis=1)
-    
-    # Reorder columns to match structure (first column + services in specified order)
-    column_order = ['Master_CPC[Service Name]'] + service_order
-    df_final = df_filtered[column_order]
+    # Keep the first row per service, restricted to the services we report
+    first_rows = df.drop_duplicates(subset='Master_CPC[Service Name]')
+    present = first_rows[first_rows['Master_CPC[Service Name]'].isin(service_order)]
+    found = set(present['Master_CPC[Service Name]'])
+    
+    # Set lookups instead of scanning the metric column list for every metric
+    available_metrics = set(metric_cols)
+    for metric in metric_order:
+        if metric not in available_metrics:
+            print(f"   ⚠ Warning: Metric '{metric}' not found in input data")
+    for service in service_order:
+        if service not in found:
+            print(f"   ⚠ Warning: Service '{service}' not found in input data")
+    
+    # The output shape is fixed (metrics × services), so allocate it once and
+    # scatter the present services/metrics into place; missing ones stay empty.
+    # Values stay float64: float32 cannot hold revenue totals to the cent
+    service_pos = {service: j for j, service in enumerate(service_order)}
+    metric_rows = [i for i, metric in enumerate(metric_order) if metric in available_metrics]
+    service_cols = [service_pos[service] for service in present['Master_CPC[Service Name]']]
+    block = present[[metric_order[i] for i in metric_rows]]
+    numeric = block.apply(pd.to_numeric, errors='coerce')
+    
+    # Non-numeric cells (e.g. '-') cannot go into the float array; leave them empty
+    coerced = numeric.isna() & block.notna()
+    for metric in block.columns[coerced.any()]:
+        names = ', '.join(present.loc[coerced[metric], 'Master_CPC[Service Name]'])
+        print(f"   ⚠ Warning: Non-numeric '{metric}' values left empty for: {names}")
+    
+    values = np.full((len(metric_order), len(service_order)), np.nan)
+    values[np.ix_(metric_rows, service_cols)] = numeric.to_numpy(dtype='float64').T
+    
+    df_final = pd.DataFrame(values, columns=service_order)
+    df_final.insert(0, 'Master_CPC[Service Name]', metric_order)
     
     print(f"   ✓ Final structure: {len(df_final)} rows × {len(df_final.columns)} columns")
     
@@ -212,11 +206,12 @@ def save_output(df: pd.DataFrame, output_file: str):
     print(f"💾 Saving output to: {output_file}")
     
     # Create the output directory if it doesn't exist
-    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    parent = Path(output_file).parent
+    if str(parent) not in ('', '.') and not parent.exists():
+        parent.mkdir(parents=True, exist_ok=True)
     
     # Save to Excel
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Services Report', index=False)
+    write_excel(df, output_file, sheet_name='Services Report', index=False)
     
     print(f"   ✓ File saved successfully")
 
@@ -249,10 +244,10 @@ def preview_results(df: pd.DataFrame):
     print(df.head(10).to_string())
     
     print("\nSummary statistics:")
-    # Count non-null values for each service
+    # Count non-null values for the first 5 services in a single pass
+    non_null = df[services[:5]].notna().sum()
     for service in services[:5]:  # Show first 5 services
-        non_null = df[service].notna().sum()
-        print(f"  {service}: {non_null}/{len(df)} metrics have data")
+        print(f"  {service}: {non_null[service]}/{len(df)} metrics have data")
     if len(services) > 5:
         print(f"  ... and {len(services) - 5} more services")
 
@@ -294,20 +289,18 @@ def main():
         # Step 2: Identify metric columns
         metric_cols = get_metric_columns(df_input)
         
-        # Step 3: Transform data structure
-        df_transformed = transform_data(df_input, metric_cols)
-        
-        # Step 4: Get hardcoded structure
+        # Step 3: Get hardcoded structure
         metric_order, service_order = get_hardcoded_structure()
         
-        # Step 5: Apply output structure
-        df_final = apply_output_structure(df_transformed, metric_order, service_order)
+        # Step 4: Transform data and apply output structure
+        df_final = apply_output_structure(df_input, metric_cols, metric_order, service_order)
         
-        # Step 6: Save output
+        # Step 5: Save output
         save_output(df_final, output_file)
         
-        # Step 7: Preview results
-        preview_results(df_final)
+        # Step 6: Preview results (skipped when output is piped or redirected)
+        if sys.stdout.isatty():
+            preview_results(df_final)
         
         print("\n" + "=" * 80)
         print("✅ TRANSFORMATION COMPLETED SUCCESSFULLY")